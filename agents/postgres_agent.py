@@ -1,9 +1,14 @@
 """PostgreSQL database schema migration agent using Claude SDK."""
 
+import asyncio
+import functools
+from contextlib import aclosing
 from pathlib import Path
-from typing import Any, Callable
+from types import TracebackType
+from typing import Any, Callable, Self
 
 from claude_agent_sdk import (
+    AssistantMessage,
     ClaudeAgentOptions,
     ClaudeSDKClient,
     HookContext,
@@ -11,17 +16,38 @@ from claude_agent_sdk import (
     HookJSONOutput,
     HookMatcher,
     ResultMessage,
+    TextBlock,
 )
 
+# Shared hook result that lets the tool proceed; the SDK copies it before sending
+_HOOK_CONTINUE: HookJSONOutput = {"continue_": True}
+
+
+@functools.lru_cache(maxsize=1)
+def _load_system_prompt_cached() -> str:
+    """Load the system prompt from the specs file, reading it only once per process."""
+    prompt_path = Path(__file__).parent.parent / "specs" / "system-prompt.md"
+    # Binary read + explicit decode skips the text-mode decoder and newline translation
+    return prompt_path.read_bytes().decode("utf-8")
+
 
 class PostgresAgent:
-    """Agent for generating PostgreSQL migrations and seeds from app ideas."""
+    """Agent for generating PostgreSQL migrations and seeds from app ideas.
+
+    The underlying Claude client is connected on first use and reused across
+    ``run()`` calls. Use the agent as an async context manager (or call
+    ``aclose()``) to disconnect it when done. Runs share one session, so
+    ``run()`` must not be called concurrently on the same agent. The SDK client
+    must be connected and disconnected in the same task, so enter the agent's
+    context and call ``run()`` from one task.
+    """
 
     def __init__(
         self,
         project_path: Path,
         todo_callback: Callable[[list[dict[str, Any]]], None] | None = None,
         message_callback: Callable[[str, str], None] | None = None,
+        text_callback: Callable[[str], None] | None = None,
     ):
         """Initialize the PostgreSQL agent.
 
@@ -29,16 +55,76 @@ class PostgresAgent:
             project_path: Path where migrations and seeds will be created
             todo_callback: Optional callback to receive todo updates from the agent
             message_callback: Optional callback to receive message updates (type, preview)
+            text_callback: Optional callback to receive the full text of each assistant text block
         """
         self.project_path = project_path
         self.todo_callback = todo_callback
         self.message_callback = message_callback
+        self.text_callback = text_callback
         self.system_prompt = self._load_system_prompt()
 
+        # Hooks and options only depend on construction-time state, so they are
+        # built once here rather than on every run().
+        # Set up hook for all PostToolUse events to capture TodoWrite.
+        self._hooks: dict[str, list[HookMatcher]] = {
+            "PostToolUse": [
+                HookMatcher(
+                    matcher=None,  # Capture all tool calls
+                    hooks=[self._post_tool_use_hook],
+                )
+            ]
+        }
+
+        # Configure agent options
+        self._options = ClaudeAgentOptions(
+            system_prompt=self.system_prompt,
+            cwd=str(self.project_path),
+            hooks=self._hooks,
+            permission_mode="bypassPermissions",  # Auto-approve all tools for seamless execution
+        )
+
+        # Created and connected lazily, then shared by all runs
+        self._client: ClaudeSDKClient | None = None
+        # Serializes connect/aclose so concurrent callers can't create two clients
+        self._client_lock = asyncio.Lock()
+
+    async def __aenter__(self) -> Self:
+        """Enter an ``async with`` block; the client connects on the first run."""
+        return self
+
+    async def __aexit__(
+        self,
+        exc_type: type[BaseException] | None,
+        exc: BaseException | None,
+        tb: TracebackType | None,
+    ) -> None:
+        """Disconnect the client when leaving an ``async with`` block."""
+        await self.aclose()
+
+    async def connect(self) -> ClaudeSDKClient:
+        """Connect the Claude client if it is not connected yet.
+
+        Returns:
+            The connected client
+        """
+        async with self._client_lock:
+            if self._client is None:
+                # Create client with hooks enabled
+                client = ClaudeSDKClient(options=self._options)
+                await client.connect()
+                self._client = client
+            return self._client
+
+    async def aclose(self) -> None:
+        """Disconnect the Claude client, if connected."""
+        async with self._client_lock:
+            client, self._client = self._client, None
+            if client is not None:
+                await client.disconnect()
+
     def _load_system_prompt(self) -> str:
         """Load the system prompt from the specs file."""
-        prompt_path = Path(__file__).parent.parent / "specs" / "system-prompt.md"
-        return prompt_path.read_text()
+        return _load_system_prompt_cached()
 
     async def _post_tool_use_hook(
         self,
@@ -49,24 +135,14 @@ class PostgresAgent:
         """Hook callback for PostToolUse events.
 
         Captures TodoWrite tool calls to extract and report todo lists to the CLI.
+        The HookMatcher registration already limits this hook to PostToolUse.
         """
-        # Type guard to check if this is a PostToolUse hook
-        if hook_input.get("hook_event_name") != "PostToolUse":
-            return {"continue_": True}
+        # Always allow the tool to proceed; only TodoWrite calls are reported
+        if self.todo_callback is None or hook_input.get("tool_name") != "TodoWrite":
+            return _HOOK_CONTINUE
 
-        post_tool_use_input = hook_input  # type: ignore[assignment]
-        assert isinstance(post_tool_use_input, dict)
-
-        tool_name = post_tool_use_input.get("tool_name")
-        tool_input = post_tool_use_input.get("tool_input", {})
-
-        # If this is a TodoWrite call, extract and report the todos
-        if tool_name == "TodoWrite" and self.todo_callback:
-            todos = tool_input.get("todos", [])
-            self.todo_callback(todos)
-
-        # Always allow the tool to proceed
-        return {"continue_": True}
+        self.todo_callback(hook_input.get("tool_input", {}).get("todos", []))
+        return _HOOK_CONTINUE
 
     async def run(self, user_idea: str) -> ResultMessage:
         """Run the agent with the user's app idea.
@@ -77,63 +153,57 @@ class PostgresAgent:
         Returns:
             ResultMessage containing the agent's final result
         """
-        # Set up hook for all PostToolUse events to capture TodoWrite
-        hooks: dict[str, list[HookMatcher]] = {
-            "PostToolUse": [
-                HookMatcher(
-                    matcher=None,  # Capture all tool calls
-                    hooks=[self._post_tool_use_hook],
-                )
-            ]
-        }
-
-        # Configure agent options
-        options = ClaudeAgentOptions(
-            system_prompt=self.system_prompt,
-            cwd=str(self.project_path),
-            hooks=hooks,
-            permission_mode="bypassPermissions",  # Auto-approve all tools for seamless execution
-        )
-
-        # Create client with hooks enabled
-        client = ClaudeSDKClient(options=options)
-
-        # Connect and send query
-        await client.connect()
-        await client.query(user_idea)
-
-        # Receive messages
-        result_message: ResultMessage | None = None
-
-        from claude_agent_sdk import AssistantMessage, TextBlock
-
-        async for message in client.receive_messages():
-            # Extract message info
-            msg_type = type(message).__name__
-            msg_preview = ""
-
-            if isinstance(message, AssistantMessage):
-                # Extract first text block
-                for block in message.content:
-                    if isinstance(block, TextBlock):
-                        first_line = block.text.split('\n')[0][:60]
-                        msg_preview = first_line
+        # Connect on first run and send query
+        client = await self.connect()
+        try:
+            await client.query(user_idea)
+
+            # Receive messages
+            result_message: ResultMessage | None = None
+
+            message_callback = self.message_callback
+            text_callback = self.text_callback
+
+            # Close the message stream as soon as the result arrives instead of
+            # leaving the generator suspended until it is garbage collected.
+            # (receive_messages is annotated as AsyncIterator but is an async generator)
+            async with aclosing(client.receive_messages()) as messages:  # type: ignore[type-var]
+                async for message in messages:
+                    # SDK message classes are not subclassed, so exact type checks
+                    # are enough (and still narrow `message` for type checkers).
+                    # Only assistant messages carry text; others get an empty preview.
+                    msg_preview = ""
+                    if type(message) is AssistantMessage and (
+                        text_callback is not None or message_callback is not None
+                    ):
+                        # Collect the text blocks once for both callbacks
+                        texts = [b.text for b in message.content if isinstance(b, TextBlock)]
+
+                        # Stream the full assistant text as it arrives
+                        if text_callback is not None:
+                            for text in texts:
+                                text_callback(text)
+
+                        # Preview: first line of the first text block
+                        if texts:
+                            msg_preview = texts[0].split('\n', 1)[0][:70]
+
+                    # Only report message info when someone is listening
+                    if message_callback is not None:
+                        message_callback(type(message).__name__, msg_preview)
+
+                    # The last message should be a ResultMessage
+                    if type(message) is ResultMessage:
+                        result_message = message
                         break
 
-            # Send to callback
-            if self.message_callback:
-                self.message_callback(msg_type, msg_preview)
-
-            # The last message should be a ResultMessage
-            if isinstance(message, ResultMessage):
-                result_message = message
-                break
-
-        # Disconnect
-        await client.disconnect()
-
-        if result_message is None:
-            raise RuntimeError("No result message received from agent")
+            if result_message is None:
+                raise RuntimeError("No result message received from agent")
+        except BaseException:
+            # The rest of this turn may still be buffered in the SDK stream, and a
+            # later run would read it as its own answer, so drop the session
+            await self.aclose()
+            raise
 
         return result_message
 
@@ -142,15 +212,20 @@ def create_agent(
     project_path: Path,
     todo_callback: Callable[[list[dict[str, Any]]], None] | None = None,
     message_callback: Callable[[str, str], None] | None = None,
+    text_callback: Callable[[str], None] | None = None,
 ) -> PostgresAgent:
     """Create a new PostgreSQL agent instance.
 
+    Use the returned agent as ``async with create_agent(...) as agent:`` so that
+    all ``agent.run()`` calls share one connection that is closed at the end.
+
     Args:
         project_path: Path where migrations and seeds will be created
         todo_callback: Optional callback to receive todo updates from the agent
         message_callback: Optional callback to receive message updates (type, preview)
+        text_callback: Optional callback to receive the full text of each assistant text block
 
     Returns:
         Configured PostgresAgent instance
     """
-    return PostgresAgent(project_path, todo_callback, message_callback)
+    return PostgresAgent(project_path, todo_callback, message_callback, text_callback)
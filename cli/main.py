@@ -1,31 +1,95 @@
 """CLI for PostgreSQL database schema migration agent."""
 
 import asyncio
+import collections
+import functools
+import itertools
+import math
 import time
 from pathlib import Path
-from typing import Any
+from typing import Any, Callable, Final
 
 import click
+from claude_agent_sdk import ResultMessage
 from rich.console import Console
 from rich.live import Live
 from rich.markdown import Markdown
 from rich.panel import Panel
+from rich.style import Style
 from rich.table import Table
 from rich.text import Text
 
 from agents.postgres_agent import create_agent
 
+try:
+    # (optional dependency, so it may have no stubs or not be installed at all)
+    import uvloop  # type: ignore[import-not-found, unused-ignore]
+except ImportError:  # uvloop is optional; fall back to the default event loop
+    uvloop = None  # type: ignore[assignment, unused-ignore]
+
+# Spinner frames for animation
+_SPINNER_FRAMES: Final[tuple[str, ...]] = ("⠋", "⠙", "⠹", "⠸", "⠼", "⠴", "⠦", "⠧", "⠇", "⠏")
+
+# Styles and icons shared by every frame, so Rich doesn't re-parse style strings
+_STYLE_BOLD = Style(bold=True)
+_STYLE_DIM = Style(dim=True)
+_STYLE_CYAN = Style(color="cyan")
+_STYLE_CYAN_BOLD = Style(color="cyan", bold=True)
+_STYLE_GREEN_BOLD = Style(color="green", bold=True)
+_ICON_DONE = Text("[✓]", style=_STYLE_GREEN_BOLD)
+_ICON_PENDING = Text("[ ]", style=_STYLE_DIM)
+
+# Number of most recent assistant text blocks shown in the live output panel
+_STREAM_TAIL_BLOCKS = 5
+# Minimum seconds between re-parsing the streamed markdown
+_STREAM_RENDER_INTERVAL = 1.0
+# Window in seconds over which bursts of TodoWrite updates are merged
+_TODO_COALESCE_WINDOW = 0.05
+
+# Event loop factory for asyncio.Runner; None selects the default loop
+_LOOP_FACTORY: Callable[[], asyncio.AbstractEventLoop] | None = (
+    uvloop.new_event_loop if uvloop is not None else None
+)
+
+
+@functools.lru_cache(maxsize=8)
+def _parse_markdown(text: str) -> Markdown:
+    """Parse markdown into a renderable, reusing it for identical results."""
+    return Markdown(text)
+
 
 class TodoTracker:
     """Track and display todos from the agent."""
 
     def __init__(self):
         self.todos: list[dict[str, Any]] = []
-        self.task_start_times: dict[int, float] = {}
-        self.task_end_times: dict[int, float] = {}
+        # Start/end time per todo index; math.nan marks "not reached yet"
+        self.task_start_times: list[float] = []
+        self.task_end_times: list[float] = []
+        # Status of each todo as of the previous update, used to detect transitions
+        self._prev_status: list[str] = []
+        # Bumped on every todo update so caches can detect changes in O(1)
+        self._version: int = 0
         self.agent_start_time: float | None = None
         self.current_message_type: str = ""
         self.current_message_preview: str = ""
+        # Most recent assistant text blocks, rendered below the todos while running
+        self._text_parts: collections.deque[str] = collections.deque(maxlen=_STREAM_TAIL_BLOCKS)
+        self._text_pending: bool = False
+        self._text_markdown: Markdown | None = None
+        self._text_rendered_at: float = 0.0
+        # Bumped whenever the streamed markdown is re-parsed
+        self._text_version: int = 0
+        # Set whenever the tracker state changes so the UI loop knows to redraw
+        self._dirty = asyncio.Event()
+        # Last rendered table, reused while only the timers and spinner have changed
+        self._cache_key: tuple[Any, ...] | None = None
+        self._cache_table: Table | None = None
+        self._cache_header_row: Text | None = None
+        # (todo index, row text, length of row text before the time suffix)
+        self._cache_timed_rows: list[tuple[int, Text, int]] = []
+        # (row text, offset of the spinner character within it)
+        self._cache_spinner_rows: list[tuple[Text, int]] = []
 
     def update_todos(self, todos: list[dict[str, Any]]) -> None:
         """Update the todo list from the agent.
@@ -33,21 +97,34 @@ class TodoTracker:
         Args:
             todos: List of todo items from the agent
         """
-        current_time = time.time()
-
-        # Track when tasks start
-        for i, todo in enumerate(todos):
+        current_time = time.monotonic()
+
+        # Grow the timing lists alongside the todo list
+        missing = len(todos) - len(self.task_start_times)
+        if missing > 0:
+            self.task_start_times.extend([math.nan] * missing)
+            self.task_end_times.extend([math.nan] * missing)
+
+        # Track when tasks start, only looking at todos whose status changed
+        for i, (old_status, todo) in enumerate(itertools.zip_longest(self._prev_status, todos)):
+            if todo is None:
+                break
             status = todo.get("status", "pending")
+            if status == old_status:
+                continue
 
             # Mark start time for newly in-progress tasks
-            if status == "in_progress" and i not in self.task_start_times:
+            if status == "in_progress" and math.isnan(self.task_start_times[i]):
                 self.task_start_times[i] = current_time
 
             # Mark end time for newly completed tasks
-            if status == "completed" and i not in self.task_end_times:
+            if status == "completed" and math.isnan(self.task_end_times[i]):
                 self.task_end_times[i] = current_time
 
+        self._prev_status = [t.get("status", "pending") for t in todos]
+        self._version += 1
         self.todos = todos
+        self._dirty.set()
 
     def update_message(self, msg_type: str, msg_preview: str) -> None:
         """Update the current message being processed.
@@ -57,136 +134,193 @@ class TodoTracker:
             msg_preview: Preview of the message content
         """
         self.current_message_type = msg_type
-        # Clean up preview: strip whitespace, ensure single line
-        self.current_message_preview = msg_preview.strip() if msg_preview else ""
+        # Clean up preview once here: first line only, stripped and truncated
+        self.current_message_preview = msg_preview.split('\n', 1)[0].strip()[:70]
+        self._dirty.set()
+
+    def update_text(self, text: str) -> None:
+        """Append a block of assistant text to the streamed output.
+
+        Args:
+            text: Full text of an assistant text block
+        """
+        self._text_parts.append(text)
+        self._text_pending = True
+        self._dirty.set()
 
-    def get_task_time(self, index: int) -> float:
+    def get_task_time(self, index: int, now: float) -> float:
         """Get the elapsed time for a task.
 
         Args:
             index: Index of the task
+            now: Current time.monotonic() value, shared across the frame
 
         Returns:
             Elapsed time in seconds
         """
-        current_time = time.time()
+        start = self.task_start_times[index]
+        end = self.task_end_times[index]
 
-        if index in self.task_end_times:
+        if not math.isnan(end):
             # Task completed - return duration
-            start = self.task_start_times.get(index, self.agent_start_time or current_time)
-            return self.task_end_times[index] - start
-        elif index in self.task_start_times:
+            if math.isnan(start):
+                start = self.agent_start_time or now
+            return end - start
+        elif not math.isnan(start):
             # Task in progress - return current duration
-            return current_time - self.task_start_times[index]
+            return now - start
         else:
             # Task not started
             return 0.0
 
-    def create_table(self, agent_elapsed: float, spinner_state: str = "⠋") -> Table:
+    def create_table(
+        self,
+        agent_elapsed: float,
+        spinner_state: str = "⠋",
+        show_output: bool = True,
+        now: float | None = None,
+    ) -> Table:
         """Create a rich table displaying the current todos.
 
+        The table is cached and reused while the todos and message are unchanged;
+        in that case only the elapsed times and spinner are updated in place.
+
         Args:
             agent_elapsed: Time elapsed since agent started
             spinner_state: Current spinner character
+            show_output: Whether to show the streamed assistant output below the todos
+            now: Current time.monotonic() value for the frame (defaults to reading the clock)
 
         Returns:
             Rich Table object
         """
-        table = Table(show_header=False, box=None, padding=(0, 0))
-
         # First row: Timer and message on same line, left-aligned
         # Always show message, truncate to fit (max 80 chars total)
-        if self.current_message_preview:
-            # Take only first line and truncate if needed
-            msg = self.current_message_preview.split('\n')[0][:70]
-        else:
-            msg = "Waiting for response..."
+        # (the preview is already normalized to a single line by update_message)
+        msg = self.current_message_preview or "Waiting for response..."
+
+        if now is None:
+            now = time.monotonic()
+
+        # Re-parse the streamed markdown at most once per render interval
+        if show_output and self._text_pending and (
+            self._text_markdown is None
+            or now - self._text_rendered_at >= _STREAM_RENDER_INTERVAL
+        ):
+            self._text_markdown = Markdown("\n\n".join(self._text_parts))
+            self._text_rendered_at = now
+            self._text_pending = False
+            self._text_version += 1
+
+        # -1 marks "output panel hidden"; real text versions start at 0
+        key = (self._version, msg, self._text_version if show_output else -1)
+        if key == self._cache_key and self._cache_table is not None:
+            assert self._cache_header_row is not None
+            self._fill_header(self._cache_header_row, agent_elapsed, msg)
+            for row_text, offset in self._cache_spinner_rows:
+                # Same-length replacement, so the existing style spans still apply
+                plain = row_text.plain
+                row_text.plain = plain[:offset] + spinner_state + plain[offset + 1:]
+            for i, row_text, prefix_len in self._cache_timed_rows:
+                row_text.right_crop(len(row_text) - prefix_len)
+                row_text.append(f"({self.get_task_time(i, now):.1f}s)", style=_STYLE_DIM)
+            return self._cache_table
+
+        table = Table(show_header=False, box=None, padding=(0, 0))
 
         header_line = Text()
-        header_line.append(f"Agent Execution ({agent_elapsed:.1f}s) - ", style="bold")
-        header_line.append(msg, style="dim")
+        self._fill_header(header_line, agent_elapsed, msg)
         table.add_row(header_line)
 
+        self._cache_key = key
+        self._cache_table = table
+        self._cache_header_row = header_line
+        self._cache_timed_rows = []
+        self._cache_spinner_rows = []
+
         # Add separator
         table.add_row("")
 
         # If no todos yet, show a waiting message
         if not self.todos:
-            table.add_row(Text(f"{spinner_state} Starting agent...", style="cyan"))
-            return table
+            starting = Text(f"{spinner_state} Starting agent...", style=_STYLE_CYAN)
+            self._cache_spinner_rows.append((starting, 0))
+            table.add_row(starting)
+
+        # Icon for running tasks, built once per frame and shared by all rows
+        icon_in_progress = Text(f"[{spinner_state}]", style=_STYLE_CYAN_BOLD)
 
         for i, todo in enumerate(self.todos):
             status = todo.get("status", "pending")
             content = todo.get("content", "")
-            task_time = self.get_task_time(i)
+            task_time = self.get_task_time(i, now)
 
             # Determine icon based on status
             if status == "completed":
-                icon = Text("[✓]", style="green bold")
+                icon = _ICON_DONE
                 time_text = f"({task_time:.1f}s)"
             elif status == "in_progress":
-                icon = Text(f"[{spinner_state}]", style="cyan bold")
+                icon = icon_in_progress
                 time_text = f"({task_time:.1f}s)"
             else:  # pending
-                icon = Text("[ ]", style="dim")
+                icon = _ICON_PENDING
                 time_text = ""
 
-            # Combine icon, content, and time
-            row_text = Text()
-            row_text.append(icon)
-            row_text.append(f" {content} ")
-            if time_text:
-                row_text.append(time_text, style="dim")
+            # Combine icon, content, and time in a single pass
+            row_text = Text.assemble(icon, f" {content} ", (time_text, _STYLE_DIM))
+            if status == "in_progress":
+                # Only running tasks have a spinner and ticking timer to refresh on cache hits
+                self._cache_spinner_rows.append((row_text, 1))
+                self._cache_timed_rows.append((i, row_text, len(row_text) - len(time_text)))
 
             table.add_row(row_text)
 
-        return table
+        # Bottom panel: assistant output streamed so far
+        if show_output and self._text_markdown is not None:
+            table.add_row("")
+            table.add_row(Panel(self._text_markdown, border_style=_STYLE_DIM))
 
+        return table
 
-async def run_agent_with_ui(project_path: Path, user_idea: str, console: Console) -> None:
-    """Run the agent with live UI updates.
+    @staticmethod
+    def _fill_header(header_line: Text, agent_elapsed: float, msg: str) -> None:
+        """Replace the contents of the header row in place."""
+        if header_line:
+            header_line.right_crop(len(header_line))
+        header_line.append(f"Agent Execution ({agent_elapsed:.1f}s) - ", style=_STYLE_BOLD)
+        header_line.append(msg, style=_STYLE_DIM)
+
+
+def _drain_latest(queue: asyncio.Queue[list[dict[str, Any]]]) -> list[dict[str, Any]] | None:
+    """Empty the queue and return its most recent item, or None if it was empty."""
+    latest = None
+    try:
+        while True:
+            latest = queue.get_nowait()
+    except asyncio.QueueEmpty:
+        pass
+    return latest
+
+
+async def _coalesce_todos(
+    queue: asyncio.Queue[list[dict[str, Any]]], tracker: TodoTracker
+) -> None:
+    """Apply only the latest todo snapshot per coalescing window to the tracker."""
+    while True:
+        todos = await queue.get()
+        # An empty list is a valid snapshot (todos cleared), so compare against None
+        latest = _drain_latest(queue)
+        tracker.update_todos(todos if latest is None else latest)
+        await asyncio.sleep(_TODO_COALESCE_WINDOW)
+
+
+async def _print_result(result: ResultMessage, console: Console) -> None:
+    """Print the agent's final result and run stats.
 
     Args:
-        project_path: Path where migrations and seeds will be created
-        user_idea: The user's application idea
+        result: Final result message from the agent
         console: Rich console for output
     """
-    tracker = TodoTracker()
-    tracker.agent_start_time = time.time()
-
-    # Create agent with todo and message callbacks
-    agent = create_agent(
-        project_path,
-        todo_callback=tracker.update_todos,
-        message_callback=tracker.update_message,
-    )
-
-    # Run agent in background task
-    agent_task = asyncio.create_task(agent.run(user_idea))
-
-    # Spinner frames for animation
-    spinner_frames = ["⠋", "⠙", "⠹", "⠸", "⠼", "⠴", "⠦", "⠧", "⠇", "⠏"]
-    frame_idx = 0
-
-    # Live update the UI while agent runs
-    with Live(console=console, refresh_per_second=4) as live:
-        while not agent_task.done():
-            elapsed = time.time() - tracker.agent_start_time
-            spinner_state = spinner_frames[frame_idx % len(spinner_frames)]
-            table = tracker.create_table(elapsed, spinner_state)
-            live.update(table)
-            frame_idx += 1
-            await asyncio.sleep(0.25)
-
-        # Final update
-        elapsed = time.time() - tracker.agent_start_time
-        table = tracker.create_table(elapsed, "✓")
-        live.update(table)
-
-    # Get the result
-    result = await agent_task
-
-    # Display final result message
     console.print()
     if result.is_error:
         # Error message in a red panel
@@ -199,8 +333,8 @@ async def run_agent_with_ui(project_path: Path, user_idea: str, console: Console
     else:
         # Success - render markdown result
         if result.result:
-            # Render the markdown content
-            md = Markdown(result.result)
+            # Render the markdown content, parsed off the event loop
+            md = await asyncio.to_thread(_parse_markdown, result.result)
             console.print(md)
         else:
             console.print("[bold green]Success![/bold green]")
@@ -213,6 +347,119 @@ async def run_agent_with_ui(project_path: Path, user_idea: str, console: Console
     console.print(f"[dim]{stats_text}[/dim]")
 
 
+async def _run_agent(
+    project_path: Path,
+    user_idea: str,
+    todo_callback: Callable[[list[dict[str, Any]]], None],
+    message_callback: Callable[[str, str], None],
+    text_callback: Callable[[str], None],
+    result_callback: Callable[[ResultMessage], None],
+) -> ResultMessage:
+    """Create, run and close an agent within the calling task.
+
+    Args:
+        project_path: Path where migrations and seeds will be created
+        user_idea: The user's application idea
+        todo_callback: Callback to receive todo updates from the agent
+        message_callback: Callback to receive message updates (type, preview)
+        text_callback: Callback to receive the full text of each assistant text block
+        result_callback: Callback to receive the result before the client disconnects
+
+    Returns:
+        ResultMessage containing the agent's final result
+    """
+    async with create_agent(
+        project_path,
+        todo_callback=todo_callback,
+        message_callback=message_callback,
+        text_callback=text_callback,
+    ) as agent:
+        result = await agent.run(user_idea)
+        result_callback(result)
+        return result
+
+
+async def run_agent_with_ui(project_path: Path, user_idea: str, console: Console) -> None:
+    """Run the agent with live UI updates.
+
+    Args:
+        project_path: Path where migrations and seeds will be created
+        user_idea: The user's application idea
+        console: Rich console for output
+    """
+    # Without a terminal (piped output, CI) skip the live UI and just print the result
+    if not console.is_terminal:
+        async with create_agent(project_path) as agent:
+            result = await agent.run(user_idea)
+            await _print_result(result, console)
+        return
+
+    tracker = TodoTracker()
+    tracker.agent_start_time = time.monotonic()
+
+    # TodoWrite updates are queued and merged so hook bursts cause one redraw.
+    # The hook runs on this event loop, so the queue can be fed directly.
+    todo_queue: asyncio.Queue[list[dict[str, Any]]] = asyncio.Queue()
+    coalescer = asyncio.create_task(_coalesce_todos(todo_queue, tracker))
+
+    # Resolved as soon as the result arrives, while the client may still be
+    # disconnecting, so the answer can be shown without waiting on that
+    result_ready: asyncio.Future[ResultMessage] = asyncio.get_running_loop().create_future()
+
+    # Run the agent in a background task. The whole agent lifecycle stays in that
+    # task, because the SDK client must connect and disconnect in the same task.
+    agent_task = asyncio.create_task(
+        _run_agent(
+            project_path,
+            user_idea,
+            todo_callback=todo_queue.put_nowait,
+            message_callback=tracker.update_message,
+            text_callback=tracker.update_text,
+            result_callback=result_ready.set_result,
+        )
+    )
+
+    spinner = itertools.cycle(_SPINNER_FRAMES)
+
+    # Live update the UI while agent runs. Redraws are driven manually: on every
+    # tracker change, plus a 1 Hz tick to advance the timer and spinner.
+    with Live(console=console, refresh_per_second=4, auto_refresh=False) as live:
+        while not (result_ready.done() or agent_task.done()):
+            now = time.monotonic()
+            elapsed = now - tracker.agent_start_time
+            spinner_state = next(spinner)
+            table = tracker.create_table(elapsed, spinner_state, now=now)
+            live.update(table, refresh=True)
+
+            dirty_task = asyncio.create_task(tracker._dirty.wait())
+            await asyncio.wait(
+                [agent_task, result_ready, dirty_task],
+                timeout=1.0,
+                return_when=asyncio.FIRST_COMPLETED,
+            )
+            dirty_task.cancel()
+            tracker._dirty.clear()
+
+        # Apply any todo update still waiting in the coalescing window
+        coalescer.cancel()
+        latest_todos = _drain_latest(todo_queue)
+        if latest_todos is not None:
+            tracker.update_todos(latest_todos)
+
+        # Final update
+        now = time.monotonic()
+        elapsed = now - tracker.agent_start_time
+        # (streamed output is dropped since the full result is printed below)
+        table = tracker.create_table(elapsed, "✓", show_output=False, now=now)
+        live.update(table, refresh=True)
+
+    # Get the result; if the run failed, awaiting the task raises its error
+    result = result_ready.result() if result_ready.done() else await agent_task
+
+    # Display final result message, then let the client finish disconnecting
+    await _print_result(result, console)
+    await agent_task
+
 @click.command()
 @click.option(
     "-p",
@@ -238,8 +485,9 @@ def build_idea(project_path: Path) -> None:
     user_idea = click.prompt("Describe your idea", type=str)
     console.print()
 
-    # Run the agent
-    asyncio.run(run_agent_with_ui(project_path, user_idea, console))
+    # Run the agent, on uvloop when it is installed
+    with asyncio.Runner(loop_factory=_LOOP_FACTORY) as runner:
+        runner.run(run_agent_with_ui(project_path, user_idea, console))
 
 
 if __name__ == "__main__":